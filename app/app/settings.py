@@ -91,6 +91,11 @@ DATABASES = {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': '/vol/db/db.sqlite3',
         #'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open between requests instead of reconnecting,
+        # checking they're still usable before each request reuses them
+        # (CONN_MAX_AGE seconds, tunable per deployment)
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -144,3 +149,18 @@ AUTH_USER_MODEL = 'core.User' # Set the AUTH_USER model configuration to the cus
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
+
+# Cache on the filesystem, so that every uWSGI worker shares one cache and
+# a write expires the cached data for all of them. The recipe, ingredient and
+# tag list ETags always keep each user's list version here, so CACHE_DIR must
+# be writable and shared by every worker, whatever RECIPE_LIST_CACHE_TIMEOUT
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', '/vol/cache'),
+    }
+}
+
+# Seconds to cache each user's recipe, ingredient and tag list responses for
+# (0, the default, caches only the list versions behind their ETags)
+RECIPE_LIST_CACHE_TIMEOUT = int(os.environ.get('RECIPE_LIST_CACHE_TIMEOUT', 0))
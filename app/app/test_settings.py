@@ -0,0 +1,27 @@
+"""
+Django settings for running the test suite.
+
+Imports the project settings and overrides those that only slow tests down.
+"""
+from app.settings import *  # noqa: F401,F403
+
+# Hash test user passwords with a fast (insecure) hasher instead of PBKDF2
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]
+
+# Keep the cache in memory too; each test process has its own
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Keep the test database in memory rather than next to the real one on disk
+DATABASES['default']['TEST'] = {'NAME': ':memory:'}  # noqa: F405
+
+# Build the test schema straight from the models instead of replaying every
+# migration (manage.py migrate still applies them outside the test runner)
+MIGRATION_MODULES = {
+    app.rsplit('.', 1)[-1]: None for app in INSTALLED_APPS  # noqa: F405
+}
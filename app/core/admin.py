@@ -3,6 +3,7 @@ Django admin modifications
 """
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db.models import Func, OuterRef, Subquery
 from core import models
 
 
@@ -35,7 +36,62 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+def _recipe_link_count(field):
+    """Return a subquery counting a recipe's rows in a link table"""
+    # COUNT as a plain function adds no GROUP BY, so a recipe without
+    # links counts 0 rather than NULL
+    return Subquery(
+        getattr(models.Recipe, field).through.objects.filter(
+            recipe_id=OuterRef('pk')
+        ).order_by().annotate(
+            count=Func('pk', function='COUNT')
+        ).values('count')
+    )
+
+
+class RecipeAdmin(admin.ModelAdmin):
+    """Define the admin page for the recipe model."""
+    ordering = ['-id']
+    list_display = ['title', 'user', 'price', 'num_ingredients', 'num_tags']
+    list_select_related = ['user']  # Join the user in the changelist query
+
+    def get_queryset(self, request):
+        """Count ingredients / tags with correlated subqueries
+
+        Unlike COUNTs over joins of both link tables, these don't multiply
+        each recipe's rows by its ingredients times its tags before grouping.
+        """
+        return super().get_queryset(request).annotate(
+            num_ingredients=_recipe_link_count('ingredients'),
+            num_tags=_recipe_link_count('tags'),
+        )
+
+    @admin.display(description='Ingredients', ordering='num_ingredients')
+    def num_ingredients(self, obj):
+        """Return the annotated number of ingredients in the recipe"""
+        return obj.num_ingredients
+
+    @admin.display(description='Tags', ordering='num_tags')
+    def num_tags(self, obj):
+        """Return the annotated number of tags on the recipe"""
+        return obj.num_tags
+
+
+class IngredientAdmin(admin.ModelAdmin):
+    """Define the admin page for the ingredient model."""
+    ordering = ['name']
+    list_display = ['name', 'user']
+    list_select_related = ['user']  # Join the user in the changelist query
+
+
+class TagAdmin(admin.ModelAdmin):
+    """Define the admin page for the tag model."""
+    ordering = ['name']
+    list_display = ['name', 'user']
+    list_select_related = ['user']  # Join the user in the changelist query
+
+
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Recipe)
-admin.site.register(models.Ingredient)
-admin.site.register(models.Tag)
+admin.site.register(models.Recipe, RecipeAdmin)
+admin.site.register(models.Ingredient, IngredientAdmin)
+admin.site.register(models.Tag, TagAdmin)
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.30 on 2026-10-15 06:06
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Merge ingredients and tags a user has more than once by name"""
+    Recipe = apps.get_model('core', 'Recipe')
+
+    for model_name, field_name in (('Ingredient', 'ingredients'),
+                                   ('Tag', 'tags')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, field_name).through
+        fk_name = model_name.lower() + '_id'
+
+        duplicates = model.objects.values('user', 'name').annotate(
+            keep_id=Min('id'),
+            total=Count('id'),
+        ).filter(total__gt=1)
+
+        for duplicate in duplicates:
+            others = model.objects.filter(
+                user=duplicate['user'],
+                name=duplicate['name'],
+            ).exclude(id=duplicate['keep_id'])
+
+            # Move the recipe links over to the row being kept
+            recipe_ids = through.objects.filter(
+                **{fk_name + '__in': others}
+            ).values_list('recipe_id', flat=True)
+            through.objects.bulk_create(
+                [
+                    through(recipe_id=recipe_id,
+                            **{fk_name: duplicate['keep_id']})
+                    for recipe_id in set(recipe_ids)
+                ],
+                ignore_conflicts=True,
+            )
+
+            others.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_ingredient_recipe_ingredients'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_names,
+            migrations.RunPython.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_ingredient_user_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_tag_user_name'),
+        ),
+    ]
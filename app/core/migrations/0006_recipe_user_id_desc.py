@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-15 06:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_unique_ingredient_and_tag_names'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', '-id'], name='recipe_user_id_desc'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-15 06:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recipe_user_id_desc'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipe',
+            options={'ordering': ['-id']},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-15 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_recipe_ordering'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='link',
+            field=models.URLField(blank=True, max_length=255),
+        ),
+    ]
@@ -33,17 +33,14 @@ class UserManager(BaseUserManager):
     def create_superuser(self, email, password):
         """Create, save, and return a new superuser."""
 
-        # Create a new user with email and password
-        usr = self.create_user(email, password)
-
-        # Set user as superuser and staff
-        usr.is_superuser = True
-        usr.is_staff = True
-
-        # Save the user model to database
-        usr.save()
-
-        return usr
+        # Create a new user with email and password, set as superuser and
+        # staff before it is first saved
+        return self.create_user(
+            email,
+            password,
+            is_superuser=True,
+            is_staff=True,
+        )
 
 
 class User(AbstractBaseUser, PermissionsMixin):
@@ -69,10 +66,17 @@ class Recipe(models.Model):
     description = models.TextField()
     time_minutes = models.IntegerField()
     price = models.DecimalField(max_digits=5, decimal_places=2)
-    link = models.CharField(max_length=255, blank=True)
+    link = models.URLField(max_length=255, blank=True)
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
 
+    class Meta:
+        # Newest first, served by the per-user index below
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['user', '-id'], name='recipe_user_id_desc'),
+        ]
+
     def __str__(self):
         """Returns the string representation of the recipe."""
         return self.title
@@ -90,6 +94,15 @@ class Ingredient(models.Model):
     # Name of the ingredient
     name = models.CharField(max_length=255)
 
+    class Meta:
+        # One ingredient per name for each user, which also indexes the lookups
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='unique_ingredient_user_name',
+            ),
+        ]
+
     def __str__(self):
         """Returns the string representation of the ingredient."""
         return self.name
@@ -106,6 +119,15 @@ class Tag(models.Model):
     # Name of the tag
     name = models.CharField(max_length=255)
 
+    class Meta:
+        # One tag per name for each user, which also indexes the lookups
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='unique_tag_user_name',
+            ),
+        ]
+
     def __str__(self):
         """Returns the string representation of the tag."""
         return self.name
@@ -5,31 +5,37 @@ Django Admin Test Suite for the core app.
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model as user_model
 from django.urls import reverse
+from decimal import Decimal
+from core import models
 
 
 class AdminSiteTests(TestCase):
     """Tests Django Admin Site"""
 
-    def setUp(self):
-        """Set up test client and create users"""
-        # Create test client
-        self.client = Client()
-
+    @classmethod
+    def setUpTestData(cls):
+        """Create the users once for all tests"""
         # Create admin user
-        self.admin_user = user_model().objects.create_superuser(
+        cls.admin_user = user_model().objects.create_superuser(
             email='admin@test.com',
             password='testpassword1234'
         )
-        # Log in admin user
-        self.client.force_login(self.admin_user)
 
         # Create a regular user
-        self.user = user_model().objects.create_user(
+        cls.user = user_model().objects.create_user(
             email='user@test.com',
             password='testpassword1234',
             name='Test User'
         )
 
+    def setUp(self):
+        """Set up test client and log in the admin user"""
+        # Create test client
+        self.client = Client()
+
+        # Log in admin user
+        self.client.force_login(self.admin_user)
+
     def test_create_user_page(self):
         """Test that the create user page functions correctly"""
 
@@ -66,3 +72,39 @@ class AdminSiteTests(TestCase):
 
         # Check that the HTTP response is OK (200)
         self.assertEqual(res.status_code, 200)
+
+    def test_recipes_list(self):
+        """Test that recipes are listed with their owner on recipe page"""
+
+        # Create a recipe for the regular user
+        recipe = models.Recipe.objects.create(
+            user=self.user,
+            title='Test Recipe',
+            time_minutes=5,
+            price=Decimal('10.00'),
+            description='Test Description'
+        )
+
+        # Give the recipe two ingredients and a tag
+        recipe.ingredients.add(*models.Ingredient.objects.bulk_create([
+            models.Ingredient(user=self.user, name='Test Ingredient'),
+            models.Ingredient(user=self.user, name='Second Ingredient'),
+        ]))
+        recipe.tags.add(models.Tag.objects.create(
+            user=self.user,
+            name='Test Tag'
+        ))
+
+        # Generate URL for recipe list
+        url = reverse('admin:core_recipe_changelist')
+
+        # Use test client to perform HTTP GET on URL
+        res = self.client.get(url)
+
+        # Check that response contains the recipe and its owner
+        self.assertContains(res, recipe.title)
+        self.assertContains(res, self.user.email)
+
+        # Check that response contains the ingredient and tag counts
+        self.assertContains(res, '<td class="field-num_ingredients">2</td>')
+        self.assertContains(res, '<td class="field-num_tags">1</td>')
@@ -1,6 +1,7 @@
 """
 Django Models Unit Test Suite for the core app.
 """
+from django.db import IntegrityError
 from django.test import TestCase
 from django.contrib.auth import get_user_model as user_model
 from decimal import Decimal
@@ -15,6 +16,11 @@ def create_user(email="TestEmail@test.com", password="TestPassword"):
 class ModelTests(TestCase):
     """Test Django Models"""
 
+    @classmethod
+    def setUpTestData(cls):
+        """Create a user once for the tests that need one"""
+        cls.user = create_user()
+
     def test_create_user_with_email_was_successful(self):
         """Test create user with email is successful"""
 
@@ -41,6 +47,8 @@ class ModelTests(TestCase):
         sample_emails = [
             ['testemail1@TEST.COM', 'testemail1@test.com'],
             ['TestEmail2@Test.com', 'TestEmail2@test.com'],
+            ['TESTEMAIL3@TEST.COM', 'TESTEMAIL3@test.com'],
+            ['"Test@Email4"@Test.com', '"Test@Email4"@test.com'],
         ]
 
         # Iterate though sample emails, check that each email is normalized
@@ -48,6 +56,15 @@ class ModelTests(TestCase):
             usr = user_model().objects.create_user(testEmail, 'test1234')
             self.assertEqual(usr.email, expectedEmail)
 
+    def test_create_user_without_password_is_unusable(self):
+        """Test creating a user with no password can't log in"""
+
+        # Create a user without a password
+        usr = user_model().objects.create_user('invited@test.com')
+
+        # Check that the user has no usable password
+        self.assertFalse(usr.has_usable_password())
+
     def test_new_user_missing_email_raises_error(self):
         """Test creating user with no email raises an error"""
 
@@ -73,15 +90,9 @@ class ModelTests(TestCase):
     def test_create_recipe(self):
         """Test creating a recipe"""
 
-        # Create a user
-        user = user_model().objects.create_user(
-            'TestEmail@Test.com',
-            'TestPassword'
-        )
-
         # Create a recipe
         recipe = models.Recipe.objects.create(
-            user=user,
+            user=self.user,
             title='Test Recipe',
             time_minutes=5,
             price=Decimal('10.00'),
@@ -93,12 +104,9 @@ class ModelTests(TestCase):
 
     def test_create_ingredient(self):
         """Test creating an ingredient"""
-        # Create a user
-        usr = create_user()
-
         # Create an ingredient
         ingredient = models.Ingredient.objects.create(
-            user=usr,
+            user=self.user,
             name='Test Ingredient 1'
         )
 
@@ -108,14 +116,21 @@ class ModelTests(TestCase):
     def test_create_tag(self):
         """Test creating a tag"""
 
-        # Create a user
-        user = create_user()
-
         # Create a tag and assign it to the user
         tag = models.Tag.objects.create(
-            user=user,
+            user=self.user,
             name='Test Tag 1'
         )
 
         # Check that the tag was created
         self.assertEqual(str(tag), tag.name)
+
+    def test_duplicate_tag_name_for_user_raises_error(self):
+        """Test a user can't have two tags with the same name"""
+
+        # Create a tag
+        models.Tag.objects.create(user=self.user, name='Test Tag 1')
+
+        # Check that creating a second tag with the same name fails
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=self.user, name='Test Tag 1')
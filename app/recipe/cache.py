@@ -0,0 +1,82 @@
+"""
+Caching of the recipe API list responses and their ETags
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Recipe, Ingredient, Tag
+
+
+def list_cache_timeout():
+    """Return how long list responses are cached for (0 when disabled)"""
+    return getattr(settings, 'RECIPE_LIST_CACHE_TIMEOUT', 0)
+
+
+def _version_key(user_id):
+    """Return the cache key holding the user's current list version"""
+    return f'recipe:list-version:{user_id}'
+
+
+def _list_version(user_id):
+    """Return the user's current list version"""
+    # Every list of the user shares one version, which invalidation
+    # replaces, so their old entries and ETags are never matched again
+    return cache.get_or_set(
+        _version_key(user_id),
+        lambda: uuid.uuid4().hex,
+        None
+    )
+
+
+def _md5(value):
+    """Return the hex MD5 digest of a string"""
+    return hashlib.md5(value.encode(), usedforsecurity=False).hexdigest()
+
+
+def list_cache_key(request, basename):
+    """Return the cache key for a list request's response data"""
+    version = _list_version(request.user.id)
+    path = _md5(request.get_full_path())
+    return f'recipe:list:{basename}:{request.user.id}:{version}:{path}'
+
+
+def list_etag(request, *args, **kwargs):
+    """Return the ETag of a list request, without building the response"""
+    version = _list_version(request.user.id)
+    accept = request.META.get('HTTP_ACCEPT', '')
+    return _md5(f'{version}:{request.get_full_path()}:{accept}')
+
+
+def invalidate_list_cache(user_id):
+    """Expire every cached list response and list ETag of the user"""
+    cache.delete(_version_key(user_id))
+
+
+def invalidate_list_cache_on_commit(user_id):
+    """Expire the user's lists once the current transaction commits
+
+    Expiring them earlier would let a concurrent list request cache the
+    uncommitted-before data under the user's new version.
+    """
+    transaction.on_commit(lambda: invalidate_list_cache(user_id))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Tag)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_owner_list_cache(sender, instance, **kwargs):
+    """Expire the owner's cached lists when their recipe data changes"""
+    # m2m_changed is sent both before and after each change of the links
+    if kwargs.get('action', 'post_').startswith('post_'):
+        invalidate_list_cache_on_commit(instance.user_id)
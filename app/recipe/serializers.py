@@ -1,11 +1,38 @@
 """
 Serializers for recipe APIs
 """
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils.translation import gettext as _
 from rest_framework import serializers
 from core.models import Recipe, Ingredient, Tag
+from recipe.cache import invalidate_list_cache_on_commit
 
 
-class TagSerializer(serializers.ModelSerializer):
+class UserOwnedNameSerializer(serializers.ModelSerializer):
+    """Base serializer for models whose name is unique for each user"""
+
+    def validate_name(self, value):
+        """Check the user doesn't already have an object with this name"""
+        # Nested under a recipe, existing names are reused instead
+        if self.parent is not None or 'request' not in self.context:
+            return value
+
+        objects = self.Meta.model.objects.filter(
+            user=self.context['request'].user,
+            name=value
+        )
+        if self.instance is not None:
+            objects = objects.exclude(pk=self.instance.pk)
+
+        if objects.exists():
+            msg = _('An object with this name already exists.')
+            raise serializers.ValidationError(msg, code='unique')
+
+        return value
+
+
+class TagSerializer(UserOwnedNameSerializer):
     """Serializer for the Tag model"""
 
     class Meta:
@@ -14,7 +41,7 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(UserOwnedNameSerializer):
     """Serializer for the Ingredient model"""
 
     class Meta:
@@ -42,14 +69,41 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('id',)
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Prefetch the nested ingredients and tags for a recipe queryset
+
+        Views rendering recipes with this serializer (or a subclass) should
+        pass their queryset through here (recipe.views.EagerLoadingMixin
+        does so), otherwise every recipe costs two extra queries for its
+        ingredients and tags.
+        Only the columns the serializer renders are loaded, so the list
+        view skips the description while the detail view loads it.
+        """
+        columns = [
+            field for field in cls.Meta.fields
+            if field not in ('ingredients', 'tags')
+        ]
+        return queryset.only('user', *columns).prefetch_related(
+            Prefetch(
+                'ingredients',
+                queryset=Ingredient.objects.only('id', 'name')
+            ),
+            Prefetch('tags', queryset=Tag.objects.only('id', 'name')),
+        )
+
     # Override the create method to handle ingredients and tags
     def create(self, validated_data):
         '''Create a recipe, handle tag retrieval or creation'''
         ingredients_data = validated_data.pop('ingredients', [])
         tags_data = validated_data.pop('tags', [])
-        recipe = Recipe.objects.create(**validated_data)
-        self._get_or_create_ingredients(ingredients_data, recipe)
-        self._get_or_create_tags(tags_data, recipe)
+
+        # Link the ingredients and tags in the recipe's transaction, so the
+        # cached lists its post_save expires on commit include them
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            self._get_or_create_ingredients(ingredients_data, recipe)
+            self._get_or_create_tags(tags_data, recipe)
         return recipe
 
     # Override the update method to handle ingedients and tags
@@ -60,40 +114,101 @@ class RecipeSerializer(serializers.ModelSerializer):
         ingredients_data = validated_data.pop('ingredients', None)
         tags_data = validated_data.pop('tags', None)
 
-        # If ingredients / tags information was provided,
-        # clear the existing ingredients and tags
-        # and get or create the new ingredients / tags
-        if ingredients_data is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients_data, instance)
+        with transaction.atomic():
+            # If ingredients / tags information was provided,
+            # clear the existing ingredients and tags
+            # and get or create the new ingredients / tags
+            if ingredients_data is not None:
+                self._clear_links(instance, 'ingredients')
+                self._get_or_create_ingredients(ingredients_data, instance)
+
+            if tags_data is not None:
+                self._clear_links(instance, 'tags')
+                self._get_or_create_tags(tags_data, instance)
+
+            # Write only the fields that were sent, in a single UPDATE,
+            # rather than saving every column (a tags / ingredients only
+            # update doesn't touch the recipe row at all)
+            if validated_data:
+                Recipe.objects.filter(pk=instance.pk).update(**validated_data)
 
-        if tags_data is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags_data, instance)
+            # None of these writes send post_save or m2m_changed signals, so
+            # expire the owner's cached lists once, when they're committed
+            invalidate_list_cache_on_commit(instance.user_id)
 
         for attribute, value in validated_data.items():
             setattr(instance, attribute, value)
-        instance.save()
         return instance
 
+    def _clear_links(self, recipe, field):
+        '''Unlink all of the recipe's ingredients or tags'''
+        # Delete the link rows directly, in a single DELETE like clear() but
+        # without its m2m_changed signals, and drop any prefetched links
+        getattr(Recipe, field).through.objects.filter(
+            recipe_id=recipe.pk
+        ).delete()
+        getattr(recipe, '_prefetched_objects_cache', {}).pop(field, None)
+
     def _get_or_create_ingredients(self, ingredients_data, recipe):
         '''Either gets or creates ingredients if they don't exist'''
-        for ingredient_data in ingredients_data:
-            ingredient, created = Ingredient.objects.get_or_create(
-                user=self.context['request'].user,
-                name=ingredient_data['name']
-            )
-            recipe.ingredients.add(ingredient)
+        ingredients = self._get_or_create_by_name(
+            Ingredient,
+            ingredients_data,
+            recipe.user_id
+        )
+
+        # Link the ingredients to the recipe with a single INSERT
+        through = Recipe.ingredients.through
+        through.objects.bulk_create(
+            [
+                through(recipe_id=recipe.pk, ingredient_id=ingredient.pk)
+                for ingredient in ingredients
+            ],
+            ignore_conflicts=True
+        )
 
-    #
     def _get_or_create_tags(self, tags_data, recipe):
         '''Either gets or creates tags if they don't exist'''
-        for tag_data in tags_data:
-            tag, created = Tag.objects.get_or_create(
-                user=self.context['request'].user,
-                name=tag_data['name']
+        tags = self._get_or_create_by_name(Tag, tags_data, recipe.user_id)
+
+        # Link the tags to the recipe with a single INSERT
+        through = Recipe.tags.through
+        through.objects.bulk_create(
+            [through(recipe_id=recipe.pk, tag_id=tag.pk) for tag in tags],
+            ignore_conflicts=True
+        )
+
+    def _get_or_create_by_name(self, model, objects_data, user_id):
+        '''Get the user's objects by name, bulk creating any missing ones'''
+        # Drop repeated names up front, keeping the order they were sent in
+        names = list(dict.fromkeys(
+            object_data['name'] for object_data in objects_data
+        ))
+        if not names:
+            return []
+
+        with transaction.atomic():
+            # Look up the names the user already has in a single query
+            existing_names = set(
+                model.objects.filter(
+                    user_id=user_id,
+                    name__in=names
+                ).values_list('name', flat=True)
+            )
+
+            # Create the missing ones with a single INSERT
+            model.objects.bulk_create(
+                [
+                    model(user_id=user_id, name=name)
+                    for name in names
+                    if name not in existing_names
+                ],
+                ignore_conflicts=True
+            )
+
+            return list(
+                model.objects.filter(user_id=user_id, name__in=names)
             )
-            recipe.tags.add(tag)
 
 
 class RecipeDetailSerializer(RecipeSerializer):
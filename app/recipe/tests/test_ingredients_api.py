@@ -2,12 +2,11 @@
 Unit Test Suite for the Ingredients API
 """
 from core.models import Recipe, Ingredient
-from recipe.serializers import IngredientSerializer
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 from django.urls import reverse
 from django.contrib.auth import get_user_model as user_model
 
@@ -15,6 +14,15 @@ from decimal import Decimal
 
 INGREDIENTS_URL = reverse('recipe:ingredient-list')
 
+# Test recipe prices
+LOW_PRICE = Decimal('5.00')
+HIGH_PRICE = Decimal('15.00')
+
+INGREDIENT_DETAIL_URL = reverse(
+    'recipe:ingredient-detail',
+    args=[0]
+).replace('/0/', '/{}/')
+
 
 def create_user(email='TestEmail@test.com', password='TestPassword'):
     """Create a test user and return it"""
@@ -23,15 +31,12 @@ def create_user(email='TestEmail@test.com', password='TestPassword'):
 
 def ingredient_detail_url(ingredient_id):
     """Returns the URL for an ingredient detail"""
-    return reverse('recipe:ingredient-detail', args=[ingredient_id])
+    return INGREDIENT_DETAIL_URL.format(ingredient_id)
 
 
-class PublicIngredientsApiTests(TestCase):
+class PublicIngredientsApiTests(SimpleTestCase):
     """Test the publicly available Ingredients API"""
-
-    def setUp(self):
-        """Setup the test client"""
-        self.client = APIClient()
+    client_class = APIClient
 
     def test_login_required(self):
         """Test that login is required for retrieving ingredients"""
@@ -45,11 +50,15 @@ class PublicIngredientsApiTests(TestCase):
 
 class PrivateIngredientsApiTests(TestCase):
     """Test private Ingredients API"""
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create the authenticated user once for all tests"""
+        cls.user = create_user()
 
     def setUp(self):
-        """Setup the test client"""
-        self.user = create_user()
-        self.client = APIClient()
+        """Log the user in to the test client"""
         self.client.force_authenticate(self.user)
 
     def test_get_ingredients_list(self):
@@ -59,20 +68,21 @@ class PrivateIngredientsApiTests(TestCase):
         Ingredient.objects.create(user=self.user, name='Rosemary')
         Ingredient.objects.create(user=self.user, name='Thyme')
 
-        # Retrieve ingredients (GET request)
-        res = self.client.get(INGREDIENTS_URL)
-
-        # Retrieve ingredients from the database (alphabetical order)
-        ingredients = Ingredient.objects.all().order_by('-name')
-
-        # Serialize the ingredients
-        serializer = IngredientSerializer(ingredients, many=True)
+        # Retrieve ingredients (GET request) with a single query
+        with self.assertNumQueries(1):
+            res = self.client.get(INGREDIENTS_URL)
 
         # Check that the response status code is 200 (OK)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
-        # Check that the response data matches the serialized data
-        self.assertEqual(res.data, serializer.data)
+        # Retrieve the serialized fields of the ingredients from the
+        # database in one query (reverse alphabetical order)
+        ingredients = list(
+            Ingredient.objects.order_by('-name').values('id', 'name')
+        )
+
+        # Check that the response data matches the ingredients
+        self.assertEqual(res.data, ingredients)
 
     def test_ingredients_limited_to_user(self):
         """Test only ingredients for the authenticated user are returned"""
@@ -108,71 +118,65 @@ class PrivateIngredientsApiTests(TestCase):
             user=self.user,
             title='Greek Salad',
             time_minutes=10,
-            price=Decimal('5.00')
+            price=LOW_PRICE
         )
         # Create two test ingredients
-        ingredient_1 = Ingredient.objects.create(
-            user=self.user,
-            name='Feta Cheese'
-        )
-        ingredient_2 = Ingredient.objects.create(
-            user=self.user,
-            name='Creme Fraiche'
-        )
+        ingredient_1, ingredient_2 = Ingredient.objects.bulk_create([
+            Ingredient(user=self.user, name='Feta Cheese'),
+            Ingredient(user=self.user, name='Creme Fraiche'),
+        ])
         # Only assign ingredient_1 to the recipe
         new_recipe.ingredients.add(ingredient_1)
 
-        # Retrieve ingredients (GET request)
-        res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
+        # Retrieve ingredients (GET request) with a single query
+        with self.assertNumQueries(1):
+            res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
-        # Serialize the ingredients
-        serializer_1 = IngredientSerializer(ingredient_1)
-        serializer_2 = IngredientSerializer(ingredient_2)
+        # Collect the ids of the returned ingredients
+        ingredient_ids = {ingredient['id'] for ingredient in res.data}
 
         # Check that the response status code is 200 (OK)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
         # Check ingredient_1 is in the response data
-        self.assertIn(serializer_1.data, res.data)
+        self.assertIn(ingredient_1.id, ingredient_ids)
 
         # Check ingredient_2 is not in the response data
-        self.assertNotIn(serializer_2.data, res.data)
+        self.assertNotIn(ingredient_2.id, ingredient_ids)
 
     def test_filter_ingredients_no_duplicates(self):
         """Test filtering ingredients does not return duplicates"""
 
-        # Create an ingredient to be assigned to two recipes
-        ingredient = Ingredient.objects.create(
-            user=self.user,
-            name='Vegan Cheese'
-        )
-
-        # Create an ingredient which will not be assigned
-        Ingredient.objects.create(
-            user=self.user,
-            name='Edamame Beans'
-        )
+        # Create an ingredient to be assigned to two recipes, and one
+        # which will not be assigned
+        ingredient, _ = Ingredient.objects.bulk_create([
+            Ingredient(user=self.user, name='Vegan Cheese'),
+            Ingredient(user=self.user, name='Edamame Beans'),
+        ])
 
         # Create two recipes
-        new_recipe_1 = Recipe.objects.create(
-            user=self.user,
-            title='Vegan Pizza',
-            time_minutes=20,
-            price=Decimal('15.00')
-        )
-        new_recipe_2 = Recipe.objects.create(
-            user=self.user,
-            title='Vegan Pasta',
-            time_minutes=10,
-            price=Decimal('5.00')
-        )
+        new_recipe_1, new_recipe_2 = Recipe.objects.bulk_create([
+            Recipe(
+                user=self.user,
+                title='Vegan Pizza',
+                time_minutes=20,
+                price=HIGH_PRICE
+            ),
+            Recipe(
+                user=self.user,
+                title='Vegan Pasta',
+                time_minutes=10,
+                price=LOW_PRICE
+            ),
+        ])
 
         # Assign the ingredient to both recipes
         new_recipe_1.ingredients.add(ingredient)
         new_recipe_2.ingredients.add(ingredient)
 
-        # Retrieve ingredients (GET request)
-        res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
+        # Retrieve ingredients (GET request) with a single query
+        with self.assertNumQueries(1):
+            res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
         # Check that the response status code is 200 (OK)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -200,14 +204,43 @@ class PrivateIngredientsApiTests(TestCase):
             payload
         )
 
-        # Refresh the ingredient from the database
-        ingredient.refresh_from_db()
-
         # Check that the response status code is 200 (OK)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
-        # Check that the ingredient was updated
-        self.assertEqual(ingredient.name, payload['name'])
+        # Check that the ingredient was updated, reading only its name
+        self.assertEqual(
+            Ingredient.objects.values_list('name', flat=True).get(
+                id=ingredient.id
+            ),
+            payload['name']
+        )
+
+    def test_update_ingredient_duplicate_name_error(self):
+        """Test renaming an ingredient to a name the user has fails"""
+
+        # Create two sample ingredients
+        Ingredient.objects.create(user=self.user, name='Flour')
+        ingredient = Ingredient.objects.create(
+            user=self.user,
+            name='Sugar'
+        )
+
+        # Attempt to rename the second ingredient to the first's name
+        res = self.client.patch(
+            ingredient_detail_url(ingredient.id),
+            {'name': 'Flour'}
+        )
+
+        # Check that the response status code is 400 (Bad Request)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Check that the ingredient was not renamed
+        self.assertEqual(
+            Ingredient.objects.values_list('name', flat=True).get(
+                id=ingredient.id
+            ),
+            'Sugar'
+        )
 
     def test_delete_ingredient_successful(self):
         """Test deleting an ingredient is successful"""
@@ -225,4 +258,4 @@ class PrivateIngredientsApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
 
         # Check that the ingredient was deleted
-        self.assertEqual(Ingredient.objects.count(), 0)
+        self.assertFalse(Ingredient.objects.filter(id=ingredient.id).exists())
@@ -7,43 +7,74 @@ from recipe.serializers import (
     RecipeDetailSerializer,
 )
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model as user_model
-from django.core.serializers.json import DjangoJSONEncoder
 
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
-import json
 from decimal import Decimal
 
 RECIPES_URL = reverse('recipe:recipe-list')
 
+RECIPE_DETAIL_URL = reverse(
+    'recipe:recipe-detail',
+    args=[0]
+).replace('/0/', '/{}/')
 
-def create_test_recipe(**params):
-    """Create a test recipe and return it"""
 
-    # Define default recipe parameters
-    defaults = {
-        'title': 'Test Recipe',
-        'time_minutes': 10,
-        'price': Decimal('15.10'),
-        'description': 'Test Description',
-        'link': 'http://www.test.com/recipe.pdf'
-    }
+# Test recipe prices
+DEFAULT_PRICE = Decimal('15.10')
+ORIGINAL_PRICE = Decimal('20.20')
+UPDATED_PRICE = Decimal('10.00')
+
+# Default test recipe parameters
+RECIPE_DEFAULTS = {
+    'title': 'Test Recipe',
+    'time_minutes': 10,
+    'price': DEFAULT_PRICE,
+    'description': 'Test Description',
+    'link': 'http://www.test.com/recipe.pdf'
+}
+
+
+def create_test_recipe(ingredients=(), tags=(), **params):
+    """Create a test recipe, assign any ingredients and tags, and return it"""
 
     # Update defaults with any passed parameters
-    defaults.update(params)
+    defaults = {**RECIPE_DEFAULTS, **params}
 
-    # Create and return the recipe
+    # Create the recipe
     recipe = Recipe.objects.create(**defaults)
+
+    # Assign the ingredients and tags, each in a single batch
+    if ingredients:
+        recipe.ingredients.add(*ingredients)
+    if tags:
+        recipe.tags.add(*tags)
+
+    # Return the recipe
     return recipe
 
 
+def create_test_recipes(specs, **params):
+    """Create a test recipe per spec with a single INSERT and return them"""
+
+    # Update defaults with the shared parameters
+    defaults = {**RECIPE_DEFAULTS, **params}
+
+    # Create and return the recipes, applying each spec's own overrides
+    return Recipe.objects.bulk_create(
+        [Recipe(**{**defaults, **spec}) for spec in specs]
+    )
+
+
 def recipe_detail_url(recipe_id):
     """Returns the URL for a recipe detail"""
-    return reverse('recipe:recipe-detail', args=[recipe_id])
+    return RECIPE_DETAIL_URL.format(recipe_id)
 
 
 def create_test_tag(user, name='Test Tag'):
@@ -56,12 +87,9 @@ def create_user(**params):
     return user_model().objects.create_user(**params)
 
 
-class PublicRecipeApiTests(TestCase):
+class PublicRecipeApiTests(SimpleTestCase):
     """Test the publicly available Recipe API features"""
-
-    def setUp(self):
-        """Set up the test client"""
-        self.client = APIClient()
+    client_class = APIClient
 
     def test_login_required(self):
         """Test that login is required to call the API"""
@@ -75,17 +103,22 @@ class PublicRecipeApiTests(TestCase):
 
 class PrivateRecipeApiTests(TestCase):
     """Test the private Recipe API features"""
+    client_class = APIClient
 
-    def setUp(self):
-        """Set up the test client and create a user"""
-        self.client = APIClient()
-
-        # Create a user
-        self.user = user_model().objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        """Create the authenticated and second users once for all tests"""
+        cls.user = user_model().objects.create_user(
             'TestEmail@test.com',
             'TestPassword'
         )
-        # Log the user in
+        cls.other_user = create_user(
+            email='newTestUsr@Test.com',
+            password='newTestPassword'
+        )
+
+    def setUp(self):
+        """Log the user in to the test client"""
         self.client.force_authenticate(self.user)
 
     def test_create_dummy_recipe(self):
@@ -95,7 +128,7 @@ class PrivateRecipeApiTests(TestCase):
         payload = {
             'title': 'Test Recipe',
             'time_minutes': 15,
-            'price': str(Decimal('15.10')),
+            'price': str(DEFAULT_PRICE),
             'description': 'Test Description',
             'link': 'http://www.test.com/recipe.pdf',
             'tags': [{'name': 'Test Tag'}]
@@ -104,21 +137,19 @@ class PrivateRecipeApiTests(TestCase):
         # Encode payload as JSON and POST to the Recipes URL
         res = self.client.post(
             RECIPES_URL,
-            json.dumps(payload),
-            content_type='application/json'
+            payload,
+            format='json'
         )
 
         # Check the response is 201 (Created)
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
 
-        # Retrieve the recipe from the database
-        recipe = Recipe.objects.get(id=res.data['id'])
-
-        # Check the recipe was created with the correct values
+        # Check the recipe was created with the correct values, using the
+        # saved recipe the response already holds
         for key in payload.keys() - {'tags'}:
-            self.assertEqual(str(getattr(recipe, key)), str(payload[key]))
+            self.assertEqual(res.data[key], payload[key])
 
-    def create_dummy_recipe_and_new_ingredients(self):
+    def test_create_dummy_recipe_and_new_ingredients(self):
         """Test creating a dummy recipe with ingredients"""
 
         # Define a recipe payload
@@ -137,8 +168,8 @@ class PrivateRecipeApiTests(TestCase):
         # Encode payload as JSON and POST to the Recipes URL
         res = self.client.post(
             RECIPES_URL,
-            json.dumps(payload),
-            content_type='application/json'
+            payload,
+            format='json'
         )
 
         # Check the response is 201 (Created)
@@ -153,21 +184,27 @@ class PrivateRecipeApiTests(TestCase):
         # Get the recipe that was created
         recipe = recipes[0]
 
+        # Retrieve the names of the recipe's ingredients in one query
+        ingredient_names = set(
+            recipe.ingredients.values_list('name', flat=True)
+        )
+
         # Check the recipe has the correct number of ingredients
-        self.assertEqual(recipe.ingredients.count(), 2)
+        self.assertEqual(len(ingredient_names), 2)
 
         # Check the recipe has the correct ingredients
         for ingredient in payload['ingredients']:
-            self.assertTrue(
-                Ingredient.objects.filter(
-                    user=self.user,
-                    name=ingredient['name']
-                ).exists()
-            )
+            self.assertIn(ingredient['name'], ingredient_names)
 
     def test_create_dummy_recipe_with_existing_ingredients(self):
         """Test creating a dummy recipe with existing ingredients"""
 
+        # Create one of the ingredients up front
+        existing_ingredient = Ingredient.objects.create(
+            user=self.user,
+            name='Test Ingredient 1'
+        )
+
         # Define a recipe payload
         payload = {
             'title': 'Test Recipe',
@@ -184,8 +221,8 @@ class PrivateRecipeApiTests(TestCase):
         # Encode payload as JSON and POST to the Recipes URL
         res = self.client.post(
             RECIPES_URL,
-            json.dumps(payload),
-            content_type='application/json'
+            payload,
+            format='json'
         )
 
         # Check the response is 201 (Created)
@@ -200,16 +237,28 @@ class PrivateRecipeApiTests(TestCase):
         # Get the recipe that was created
         recipe = recipes[0]
 
-        # Check the recipe has the correct number of ingredients
-        self.assertEqual(recipe.ingredients.count(), 2)
+        # Retrieve the ids of the recipe's ingredients, by name
+        ingredient_ids = dict(recipe.ingredients.values_list('name', 'id'))
 
-        # Retrieve the ingredients associated with the recipe
-        ingredients = recipe.ingredients.all()
+        # Check the recipe has the correct number of ingredients
+        self.assertEqual(len(ingredient_ids), 2)
 
         # Check the recipe has the correct ingredients
-        ingredient_names = [ingredient.name for ingredient in ingredients]
-        self.assertIn('Test Ingredient 1', ingredient_names)
-        self.assertIn('Test Ingredient 2', ingredient_names)
+        self.assertIn('Test Ingredient 1', ingredient_ids)
+        self.assertIn('Test Ingredient 2', ingredient_ids)
+
+        # Check the existing ingredient was reused rather than duplicated
+        self.assertEqual(
+            ingredient_ids['Test Ingredient 1'],
+            existing_ingredient.id
+        )
+        self.assertEqual(
+            Ingredient.objects.filter(
+                user=self.user,
+                name='Test Ingredient 1'
+            ).count(),
+            1
+        )
 
     def test_create_dummy_recipe_and_new_tags(self):
         """Test creating a recipe with new tags"""
@@ -229,29 +278,34 @@ class PrivateRecipeApiTests(TestCase):
         # Encode payload as JSON and POST to the Recipes URL
         res = self.client.post(
             RECIPES_URL,
-            json.dumps(payload, cls=DjangoJSONEncoder),
-            content_type='application/json'
+            payload,
+            format='json'
         )
 
         # Check the response is 201 (Created)
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
 
-        # Retrieve the recipe from the database
-        recipe = Recipe.objects.get(id=res.data['id'])
-
-        # Retrieve the tags associated with the recipe
-        tags = recipe.tags.all()
+        # Retrieve the names of the tags associated with the recipe
+        tag_names = list(
+            Tag.objects.filter(recipe=res.data['id']).values_list(
+                'name',
+                flat=True
+            )
+        )
 
         # Check the recipe has the correct number of tags
-        self.assertEqual(tags.count(), 2)
+        self.assertEqual(len(tag_names), 2)
 
         # Check the recipe has the correct tags
-        tag_names = [tag.name for tag in tags]
         self.assertIn('Test Tag 1', tag_names)
         self.assertIn('Test Tag 2', tag_names)
 
     def test_create_dummy_recipe_with_existing_tags(self):
         """Test creating a recipe with existing tags"""
+
+        # Create one of the tags up front
+        existing_tag = create_test_tag(user=self.user, name='Test Tag 1')
+
         # Define recipe payload with tags
         payload = {
             'title': 'Test Title',
@@ -267,26 +321,115 @@ class PrivateRecipeApiTests(TestCase):
         # Encode payload as JSON and POST to the Recipes URL
         res = self.client.post(
             RECIPES_URL,
-            json.dumps(payload, cls=DjangoJSONEncoder),
-            content_type='application/json'
+            payload,
+            format='json'
         )
 
         # Check the response is 201 (Created)
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
 
-        # Retrieve the recipe from the database
-        recipe = Recipe.objects.get(id=res.data['id'])
-
-        # Retrieve the tags associated with the recipe
-        tags = recipe.tags.all()
+        # Retrieve the ids of the tags associated with the recipe, by name
+        tag_ids = dict(
+            Tag.objects.filter(recipe=res.data['id']).values_list('name', 'id')
+        )
 
         # Check the recipe has the correct number of tags
-        self.assertEqual(tags.count(), 2)
+        self.assertEqual(len(tag_ids), 2)
 
         # Check the recipe has the correct tags
-        tag_names = [tag.name for tag in tags]
-        self.assertIn('Test Tag 1', tag_names)
-        self.assertIn('Test Tag 2', tag_names)
+        self.assertIn('Test Tag 1', tag_ids)
+        self.assertIn('Test Tag 2', tag_ids)
+
+        # Check the existing tag was reused rather than duplicated
+        self.assertEqual(tag_ids['Test Tag 1'], existing_tag.id)
+        self.assertEqual(
+            Tag.objects.filter(user=self.user, name='Test Tag 1').count(),
+            1
+        )
+
+    def test_create_dummy_recipe_invalid_link_error(self):
+        """Test creating a recipe with an invalid link returns an error"""
+
+        # Define a recipe payload with a link that isn't a URL
+        payload = {
+            'title': 'Test Recipe',
+            'time_minutes': 15,
+            'price': str(DEFAULT_PRICE),
+            'description': 'Test Description',
+            'link': 'not a link',
+        }
+
+        # POST the payload to the Recipes URL
+        res = self.client.post(RECIPES_URL, payload)
+
+        # Check the response is 400 (Bad Request)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Check the recipe was not created
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def test_create_dummy_recipe_with_duplicate_tags(self):
+        """Test creating a recipe with a tag repeated in the payload"""
+
+        # Define recipe payload with the same tag twice
+        payload = {
+            'title': 'Test Title',
+            'tags': [
+                {'name': 'Test Tag 1'},
+                {'name': 'Test Tag 1'},
+            ],
+            'time_minutes': 60,
+            'description': 'Test Description',
+            'price': 20.00
+        }
+
+        # Encode payload as JSON and POST to the Recipes URL
+        res = self.client.post(
+            RECIPES_URL,
+            payload,
+            format='json'
+        )
+
+        # Check the response is 201 (Created)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        # Check the tag was only created and assigned once
+        self.assertEqual(Tag.objects.filter(recipe=res.data['id']).count(), 1)
+        self.assertEqual(
+            Tag.objects.filter(user=self.user, name='Test Tag 1').count(),
+            1
+        )
+
+    def test_create_dummy_recipe_query_count(self):
+        """Test creating a recipe costs the same queries however many
+        ingredients and tags it has"""
+
+        # Define a recipe payload with several new ingredients and tags
+        payload = {
+            'title': 'Test Title',
+            'time_minutes': 60,
+            'description': 'Test Description',
+            'price': 20.00,
+            'ingredients': [
+                {'name': f'Test Ingredient {i}'} for i in range(5)
+            ],
+            'tags': [{'name': f'Test Tag {i}'} for i in range(5)],
+        }
+
+        # POST to the Recipes URL, checking the ingredients and tags are
+        # each looked up, created and linked in bulk, in one transaction
+        # (a savepoint under the test case's): the recipe INSERT, then per
+        # model a savepoint, lookup, INSERT, fetch, release and link INSERT,
+        # the release, then one read each for the response
+        with self.assertNumQueries(17):
+            res = self.client.post(RECIPES_URL, payload, format='json')
+
+        # Check the response is 201 (Created)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        # Check all the ingredients and tags were assigned
+        self.assertEqual(len(res.data['ingredients']), 5)
+        self.assertEqual(len(res.data['tags']), 5)
 
     def test_get_recipe_details(self):
         """Test retrieving recipe details"""
@@ -297,122 +440,418 @@ class PrivateRecipeApiTests(TestCase):
         # Generate the URL for the recipe detail
         url = recipe_detail_url(recipe.id)
 
-        # Use test client to perform HTTP GET on the recipe detail URL
-        res = self.client.get(url)
-
-        # Pass the recipe to the serializer
-        serializer = RecipeDetailSerializer(recipe)
+        # Use test client to perform HTTP GET on the recipe detail URL,
+        # checking the ingredients and tags are prefetched
+        # (recipe + ingredients + tags)
+        with self.assertNumQueries(3):
+            res = self.client.get(url)
 
         # Check the response is 200 (OK)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+        # Pass the recipe to the serializer
+        serializer = RecipeDetailSerializer(recipe)
+
         # Check the response data matches the serialized data
         self.assertEqual(res.data, serializer.data)
 
     def test_get_recipe_list(self):
         """Test retrieving a list of recipes"""
 
-        # Create some recipes
-        create_test_recipe(user=self.user)
-        create_test_recipe(user=self.user)
+        # Create some recipes, each with an ingredient and a tag
+        recipes = create_test_recipes([{}, {}, {}], user=self.user)
+        for recipe in recipes:
+            recipe.ingredients.add(Ingredient.objects.create(
+                user=self.user,
+                name=f'Test Ingredient {recipe.id}'
+            ))
+            recipe.tags.add(create_test_tag(
+                user=self.user,
+                name=f'Test Tag {recipe.id}'
+            ))
+
+        # Use test client to perform HTTP GET on the Recipes URL, checking
+        # the ingredients and tags are fetched in one query each rather
+        # than per recipe (recipes + ingredients + tags)
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL)
 
-        # Use test client to perform HTTP GET on the Recipes URL
-        res = self.client.get(RECIPES_URL)
+        # Check the response is 200 (OK)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        # Retrieve all recipe ids from database (ordered by recency)
+        recipe_ids = list(
+            Recipe.objects.order_by('-id').values_list('id', flat=True)
+        )
+
+        # Check the response lists the same recipes in the same order
+        self.assertEqual([recipe['id'] for recipe in res.data], recipe_ids)
+
+    def test_get_recipe_list_limited_to_user(self):
+        """Test recipe list is limited to authenticated user"""
 
-        # Retrieve all recipes from database (ordered by recency)
-        recipes = Recipe.objects.all().order_by('-id')
+        # Create a recipe for each user
+        create_test_recipes([{'user': self.other_user}, {'user': self.user}])
 
-        # Pass the recipes to the serializer
-        serializer = RecipeSerializer(recipes, many=True)
+        # Use test client to perform HTTP GET on the Recipes URL
+        # (recipes + ingredients + tags)
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL)
 
         # Check the response is 200 (OK)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
-        # Check the response data matches the serialized data
-        self.assertEqual(res.data, serializer.data)
+        # Retrieve all recipe ids for the authenticated user (ordered by
+        # recency, as the view returns them)
+        recipe_ids = list(
+            Recipe.objects.filter(user=self.user).order_by('-id').values_list(
+                'id',
+                flat=True
+            )
+        )
 
-    def test_get_recipe_list_limited_to_user(self):
-        """Test recipe list is limited to authenticated user"""
+        # Check the response lists only the authenticated user's recipes
+        self.assertEqual([recipe['id'] for recipe in res.data], recipe_ids)
+
+    def test_get_recipe_list_paginated(self):
+        """Test the recipe list returns a page when a limit is given"""
+
+        # Create three recipes
+        create_test_recipes([{'user': self.user}] * 3)
+
+        # Perform HTTP GET on the Recipes URL for the second page of two
+        res = self.client.get(RECIPES_URL, {'limit': 2, 'offset': 2})
 
-        # Create a second user
-        new_user = user_model().objects.create_user(
-            'newTestUsr@Test.com',
-            'newTestPassword',
+        # Check the response is 200 (OK)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        # Retrieve the oldest recipe id, last in the view's ordering
+        recipe_id = Recipe.objects.order_by('id').values_list(
+            'id',
+            flat=True
+        ).first()
+
+        # Check the page counts every recipe but holds only the last one
+        self.assertEqual(res.data['count'], 3)
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [recipe_id]
         )
 
-        # Create some recipes for each user
-        create_test_recipe(user=new_user)
+    def test_get_recipe_list_with_token(self):
+        """Test the recipe list authenticates with a token header"""
+
+        # Create a recipe
         create_test_recipe(user=self.user)
 
-        # Use test client to perform HTTP GET on the Recipes URL
+        # Swap the forced authentication for the user's token
+        token = Token.objects.create(user=self.user)
+        self.client.force_authenticate(user=None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        # Use test client to perform HTTP GET on the Recipes URL, checking
+        # the token and its user are read in one query
+        # (token + recipes + ingredients + tags)
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL)
+
+        # Check the response is 200 (OK) and lists the user's recipe
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+
+    def test_get_recipe_list_not_modified(self):
+        """Test a repeated recipe list request with its ETag returns 304"""
+
+        # Create a recipe and perform HTTP GET on the Recipes URL
+        create_test_recipe(user=self.user)
         res = self.client.get(RECIPES_URL)
+        self.assertIn('ETag', res)
+
+        # Repeat the request, passing the ETag of the first response and
+        # checking the recipes aren't queried for
+        with self.assertNumQueries(0):
+            res = self.client.get(
+                RECIPES_URL,
+                HTTP_IF_NONE_MATCH=res['ETag']
+            )
 
-        # Retrieve all recipes for the authenticated user
-        recipes = Recipe.objects.filter(user=self.user)
+        # Check the list is not sent again
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
 
-        # Pass the recipes to the serializer
-        serializer = RecipeSerializer(recipes, many=True)
+    def test_get_recipe_list_modified_after_write(self):
+        """Test a recipe list ETag no longer matches after a write"""
 
-        # Check the response is 200 (OK)
+        # Perform HTTP GET on the Recipes URL, keeping its ETag
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        # Create a recipe through the API
+        payload = {
+            'title': 'Test Recipe',
+            'time_minutes': 15,
+            'price': str(DEFAULT_PRICE),
+            'description': 'Test Description',
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(RECIPES_URL, payload, format='json')
+
+        # Repeat the request, passing the old ETag
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        # Check the new list is sent, with a new ETag
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        self.assertNotEqual(res['ETag'], etag)
 
-        # Check the response data matches the serialized data
-        self.assertEqual(res.data, serializer.data)
+    @override_settings(RECIPE_LIST_CACHE_TIMEOUT=60)
+    def test_get_recipe_list_cached(self):
+        """Test a repeated recipe list request is served from the cache"""
 
-    def test_filter_recipes_by_ingredients(self):
-        recipe_1 = create_test_recipe(user=self.user, title="Pea Soup")
-        recipe_2 = create_test_recipe(user=self.user, title="Brushetta")
-        recipe_3 = create_test_recipe(user=self.user, title="Lasagna")
+        # Start from an empty cache and create a recipe
+        cache.clear()
+        create_test_recipe(user=self.user)
+
+        # Perform HTTP GET on the Recipes URL to fill the cache
+        res = self.client.get(RECIPES_URL)
+
+        # Repeat the request, checking it doesn't touch the database
+        with self.assertNumQueries(0):
+            cached_res = self.client.get(RECIPES_URL)
+
+        # Check the cached response matches the original
+        self.assertEqual(cached_res.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached_res.data, res.data)
+
+    @override_settings(RECIPE_LIST_CACHE_TIMEOUT=60)
+    def test_recipe_list_cache_expired_by_writes(self):
+        """Test creating a recipe or renaming a tag expires the cached list"""
+
+        # Start from an empty cache and fill it with an empty list
+        cache.clear()
+        self.client.get(RECIPES_URL)
+
+        # Create a recipe through the API
+        payload = {
+            'title': 'Test Recipe',
+            'time_minutes': 15,
+            'price': str(DEFAULT_PRICE),
+            'description': 'Test Description',
+            'tags': [{'name': 'Test Tag'}],
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(RECIPES_URL, payload, format='json')
 
-        ingredient_1 = Ingredient.objects.create(
+        # Check the list now includes the new recipe
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data), 1)
+
+        # Rename the tag outside the API
+        tag = Tag.objects.get(user=self.user, name='Test Tag')
+        tag.name = 'Renamed Tag'
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.save()
+
+        # Check the list shows the new tag name
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data[0]['tags'][0]['name'], 'Renamed Tag')
+
+    def test_recipe_list_expired_on_commit(self):
+        """Test a write expires the recipe list only once it commits"""
+
+        # Create a tag and perform HTTP GET on the Recipes URL, keeping
+        # its ETag
+        tag = create_test_tag(user=self.user)
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            # Create a recipe with the tag
+            create_test_recipe(user=self.user, tags=[tag])
+
+            # Check the ETag still matches before the write commits
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Check the recipe and its link each expired the list once (not
+        # before the link was added as well)
+        self.assertEqual(len(callbacks), 2)
+
+        # Check the ETag no longer matches once the write has committed
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_update_recipe_expires_list_once(self):
+        """Test replacing a recipe's ingredients and tags expires the list
+        once"""
+
+        # Create a recipe with an ingredient and a tag
+        recipe = create_test_recipe(
             user=self.user,
-            name='Peas'
+            ingredients=[Ingredient.objects.create(
+                user=self.user,
+                name='Test Ingredient'
+            )],
+            tags=[create_test_tag(user=self.user)]
         )
-        ingredient_2 = Ingredient.objects.create(
-            user=self.user,
-            name='Tomatoes'
+
+        # PATCH new ingredients and tags to the recipe, capturing the
+        # list expiries it schedules
+        payload = {
+            'ingredients': [{'name': 'New Ingredient'}],
+            'tags': [{'name': 'New Tag'}],
+        }
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            res = self.client.patch(
+                recipe_detail_url(recipe.id),
+                payload,
+                format='json'
+            )
+
+        # Check the recipe was updated, expiring the list once
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(callbacks), 1)
+
+    @override_settings(RECIPE_LIST_CACHE_TIMEOUT=60)
+    def test_recipe_list_cache_expired_by_serializer_update(self):
+        """Test updating a recipe through its serializer expires the list"""
+
+        # Start from an empty cache and fill it with a recipe
+        cache.clear()
+        recipe = create_test_recipe(user=self.user, title='Test Recipe')
+        self.client.get(RECIPES_URL)
+
+        # Rename the recipe through its serializer, outside the API
+        serializer = RecipeDetailSerializer(
+            recipe,
+            data={'title': 'Renamed Recipe'},
+            partial=True
         )
+        self.assertTrue(serializer.is_valid())
+        with self.captureOnCommitCallbacks(execute=True):
+            serializer.save()
 
-        recipe_1.ingredients.add(ingredient_1)
-        recipe_2.ingredients.add(ingredient_2)
+        # Check the list shows the new title
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data[0]['title'], 'Renamed Recipe')
+
+    def test_filter_recipes_by_ingredients(self):
+        recipe_1, recipe_2, recipe_3 = create_test_recipes(
+            [
+                {'title': 'Pea Soup'},
+                {'title': 'Brushetta'},
+                {'title': 'Lasagna'},
+            ],
+            user=self.user
+        )
+
+        ingredient_1, ingredient_2 = Ingredient.objects.bulk_create([
+            Ingredient(user=self.user, name='Peas'),
+            Ingredient(user=self.user, name='Tomatoes'),
+        ])
+
+        # Link the first two recipes to an ingredient each in one INSERT
+        through = Recipe.ingredients.through
+        through.objects.bulk_create([
+            through(recipe_id=recipe_1.id, ingredient_id=ingredient_1.id),
+            through(recipe_id=recipe_2.id, ingredient_id=ingredient_2.id),
+        ])
 
         params = {'ingredients': f'{ingredient_1.id},{ingredient_2.id}'}
 
-        res = self.client.get(RECIPES_URL, params)
+        # Filtered recipes still prefetch ingredients and tags in bulk
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL, params)
 
-        serializer_1 = RecipeSerializer(recipe_1)
-        serializer_2 = RecipeSerializer(recipe_2)
-        serializer_3 = RecipeSerializer(recipe_3)
+        # Serialize all three recipes in one pass
+        serialized = RecipeSerializer(
+            [recipe_1, recipe_2, recipe_3],
+            many=True
+        ).data
 
-        self.assertIn(serializer_1.data, res.data)
-        self.assertIn(serializer_2.data, res.data)
-        self.assertNotIn(serializer_3.data, res.data)
+        self.assertIn(serialized[0], res.data)
+        self.assertIn(serialized[1], res.data)
+        self.assertNotIn(serialized[2], res.data)
 
     def test_filter_recipes_by_tags(self):
-        recipe_1 = create_test_recipe(user=self.user, title="Pea Soup")
-        recipe_2 = create_test_recipe(user=self.user, title="Brushetta")
-        recipe_3 = create_test_recipe(user=self.user, title="Lasagna")
+        recipe_1, recipe_2, recipe_3 = create_test_recipes(
+            [
+                {'title': 'Pea Soup'},
+                {'title': 'Brushetta'},
+                {'title': 'Lasagna'},
+            ],
+            user=self.user
+        )
 
         tag_1 = create_test_tag(user=self.user, name="Vegan")
         tag_2 = create_test_tag(user=self.user, name="Quick and Easy")
 
-        recipe_1.tags.add(tag_1)
-        recipe_2.tags.add(tag_2)
+        # Link the first two recipes to a tag each in one INSERT
+        through = Recipe.tags.through
+        through.objects.bulk_create([
+            through(recipe_id=recipe_1.id, tag_id=tag_1.id),
+            through(recipe_id=recipe_2.id, tag_id=tag_2.id),
+        ])
 
         params = {'tags': f'{tag_1.id},{tag_2.id}'}
 
+        # Filtered recipes still prefetch ingredients and tags in bulk
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL, params)
+
+        # Serialize all three recipes in one pass
+        serialized = RecipeSerializer(
+            [recipe_1, recipe_2, recipe_3],
+            many=True
+        ).data
+
+        self.assertIn(serialized[0], res.data)
+        self.assertIn(serialized[1], res.data)
+        self.assertNotIn(serialized[2], res.data)
+
+    def test_filter_recipes_no_duplicates(self):
+        """Test a recipe matching several filter ids is returned once"""
+
+        # Create a recipe with two ingredients and two tags
+        ingredient_1, ingredient_2 = Ingredient.objects.bulk_create([
+            Ingredient(user=self.user, name='Peas'),
+            Ingredient(user=self.user, name='Tomatoes'),
+        ])
+        tag_1 = create_test_tag(user=self.user, name='Vegan')
+        tag_2 = create_test_tag(user=self.user, name='Quick and Easy')
+        recipe = create_test_recipe(
+            user=self.user,
+            ingredients=[ingredient_1, ingredient_2],
+            tags=[tag_1, tag_2]
+        )
+
+        # Filter by both ingredients and both tags
+        params = {
+            'ingredients': f'{ingredient_1.id},{ingredient_2.id}',
+            'tags': f'{tag_1.id},{tag_2.id}',
+        }
         res = self.client.get(RECIPES_URL, params)
 
-        serializer_1 = RecipeSerializer(recipe_1)
-        serializer_2 = RecipeSerializer(recipe_2)
-        serializer_3 = RecipeSerializer(recipe_3)
+        # Check the recipe is returned exactly once
+        self.assertEqual([r['id'] for r in res.data], [recipe.id])
 
-        self.assertIn(serializer_1.data, res.data)
-        self.assertIn(serializer_2.data, res.data)
-        self.assertNotIn(serializer_3.data, res.data)
+    def test_filter_recipes_invalid_ids_error(self):
+        """Test filtering recipes by malformed ids returns an error"""
+
+        # Filter by an id that isn't a number, and by one too large for
+        # the database, checking both responses are 400 (Bad Request)
+        for tags in ('1,abc', '99999999999999999999999'):
+            res = self.client.get(RECIPES_URL, {'tags': tags})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Filter by a list without any ids
+        create_test_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL, {'tags': ','})
+
+        # Check no filter was applied, as for an empty parameter
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
 
     def test_partial_update_recipe(self):
-        """Test partially updating a recipe (PATCH)"""
+        """Test partially updating a recipe through its serializer"""
         original_url = 'http://www.test.com/recipe.pdf'
 
         # Create a recipe from the original URL
@@ -425,17 +864,14 @@ class PrivateRecipeApiTests(TestCase):
         # Define the new recipe payload
         payload = {'title': 'New Test Recipe Title'}
 
-        # Generate the URL for the recipe detail
-        url = recipe_detail_url(recipe.id)
+        # Apply the payload as a partial update (as a PATCH would),
+        # skipping the HTTP stack the other PATCH tests already cover
+        serializer = RecipeDetailSerializer(recipe, data=payload, partial=True)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
 
-        # Perform HTTP PATCH on the recipe detail URL
-        res = self.client.patch(url, payload)
-
-        # Check the response is 200 (OK)
-        self.assertEqual(res.status_code, status.HTTP_200_OK)
-
-        # Refresh the recipe from the database
-        recipe.refresh_from_db()
+        # Refresh only the checked fields from the database
+        recipe.refresh_from_db(fields=['title', 'link', 'user'])
 
         # Check the recipe was updated with the new title
         self.assertEqual(recipe.title, payload['title'])
@@ -444,7 +880,7 @@ class PrivateRecipeApiTests(TestCase):
         self.assertEqual(recipe.link, original_url)
 
         # Check the recipe was NOT updated with a new user
-        self.assertEqual(recipe.user, self.user)
+        self.assertEqual(recipe.user_id, self.user.id)
 
     def test_complete_update_recipe(self):
         """Test completely updating a recipe (PUT)"""
@@ -454,7 +890,7 @@ class PrivateRecipeApiTests(TestCase):
             user=self.user,
             title='Test Recipe Title',
             time_minutes=20,
-            price=Decimal('20.20'),
+            price=ORIGINAL_PRICE,
             description='Test Description',
             link='http://www.test.com/recipe.pdf'
         )
@@ -463,7 +899,7 @@ class PrivateRecipeApiTests(TestCase):
         payload = {
             'title': 'New Test Recipe Title',
             'time_minutes': 10,
-            'price': Decimal('10.00'),
+            'price': UPDATED_PRICE,
             'description': 'New Test Description',
             'link': 'http://www.newtest.com/recipe.pdf'
         }
@@ -477,15 +913,15 @@ class PrivateRecipeApiTests(TestCase):
         # Check the response is 200 (OK)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
-        # Refresh the recipe from the database
-        recipe.refresh_from_db()
+        # Refresh only the checked fields from the database
+        recipe.refresh_from_db(fields=[*payload, 'user'])
 
         # Check the recipe was updated with the new values
         for key, value in payload.items():
             self.assertEqual(getattr(recipe, key), value)
 
         # Check the recipe was NOT updated with a new user
-        self.assertEqual(recipe.user, self.user)
+        self.assertEqual(recipe.user_id, self.user.id)
 
     def test_create_ingredient_when_updating_recipe(self):
         """Test ingredient creation when recipes are updated"""
@@ -499,18 +935,18 @@ class PrivateRecipeApiTests(TestCase):
         # Perform HTTP PATCH on the recipe detail URL
         res = self.client.patch(
             recipe_detail_url(recipe.id),
-            json.dumps(payload, cls=DjangoJSONEncoder),
-            content_type='application/json'
+            payload,
+            format='json'
         )
 
         # Check the response is 200 (OK)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
-        # GET the ingredient from the database
-        new_ingredient = Ingredient.objects.get(name='Test Ingredient')
-
         # Check the ingredient was created and is associated with the recipe
-        self.assertIn(new_ingredient, recipe.ingredients.all())
+        self.assertIn(
+            'Test Ingredient',
+            recipe.ingredients.values_list('name', flat=True)
+        )
 
     def test_assign_ingredient_when_updating_recipe(self):
         """Test assignment of existing ingredient when recipes are updated"""
@@ -521,11 +957,11 @@ class PrivateRecipeApiTests(TestCase):
             name='Old Ingredient'
         )
 
-        # Create a test recipe
-        recipe = create_test_recipe(user=self.user)
-
-        # Assign the test ingredient to the test recipe
-        recipe.ingredients.add(old_ingredient)
+        # Create a test recipe with the test ingredient assigned
+        recipe = create_test_recipe(
+            user=self.user,
+            ingredients=[old_ingredient]
+        )
 
         # Define the recipe update payload (with new ingredient)
         payload = {'ingredients': [{'name': 'New Ingredient'}]}
@@ -533,37 +969,35 @@ class PrivateRecipeApiTests(TestCase):
         # Perform HTTP PATCH on the recipe detail URL
         res = self.client.patch(
             recipe_detail_url(recipe.id),
-            json.dumps(payload, cls=DjangoJSONEncoder),
-            content_type='application/json'
+            payload,
+            format='json'
         )
 
         # Check the response is 200 (OK)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
-        # Refresh the recipe to get updated data
-        recipe.refresh_from_db()
+        # Retrieve the names of the recipe's ingredients
+        ingredient_names = list(
+            recipe.ingredients.values_list('name', flat=True)
+        )
 
         # Check the old ingredient is no longer associated with the recipe
-        self.assertNotIn(old_ingredient, recipe.ingredients.all())
+        self.assertNotIn(old_ingredient.name, ingredient_names)
 
         # Check the new ingredient is associated with the recipe
-        ingredient_names = [ing.name for ing in recipe.ingredients.all()]
         self.assertIn('New Ingredient', ingredient_names)
 
     def test_update_recipe_delete_ingredients(self):
         """Test deleting assigned ingredients from a recipe"""
 
-        # Create a recipe
-        recipe = create_test_recipe(user=self.user)
-
         # Create an ingredient
         ingredient = Ingredient.objects.create(
             user=self.user,
             name='Test Ingredient'
         )
 
-        # Assign the ingredient to the recipe
-        recipe.ingredients.add(ingredient)
+        # Create a recipe with the ingredient assigned
+        recipe = create_test_recipe(user=self.user, ingredients=[ingredient])
 
         # Define the recipe update payload (no ingredients)
         payload = {'ingredients': []}
@@ -578,7 +1012,7 @@ class PrivateRecipeApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
         # Check ingredients were cleared from the recipe
-        self.assertEqual(recipe.ingredients.count(), 0)
+        self.assertFalse(recipe.ingredients.exists())
 
     def test_create_tag_when_updating_recipe(self):
         """Test tag creation when recipes are updated"""
@@ -594,18 +1028,15 @@ class PrivateRecipeApiTests(TestCase):
         # Perform HTTP PATCH on the recipe detail URL
         res = self.client.patch(
             url,
-            json.dumps(payload, cls=DjangoJSONEncoder),
-            content_type='application/json'
+            payload,
+            format='json'
         )
 
         # Check the response is 200 (OK)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
-        # GET the tag from the database
-        new_tag = Tag.objects.get(name='Test Tag')
-
         # Check the tag was created and is associated with the recipe
-        self.assertTrue(new_tag in recipe.tags.all())
+        self.assertIn('Test Tag', recipe.tags.values_list('name', flat=True))
 
     def test_assign_tag_when_updating_recipe(self):
         """Test assignment of an existing tag when recipes are updated"""
@@ -613,11 +1044,8 @@ class PrivateRecipeApiTests(TestCase):
         # Create a test tag
         old_tag = create_test_tag(user=self.user, name='Old Test Tag')
 
-        # Create a test recipe
-        recipe = create_test_recipe(user=self.user)
-
-        # Assign the test tag to the test recipe
-        recipe.tags.add(old_tag)
+        # Create a test recipe with the test tag assigned
+        recipe = create_test_recipe(user=self.user, tags=[old_tag])
 
         # Generate the URL for the recipe detail
         url = recipe_detail_url(recipe.id)
@@ -628,34 +1056,30 @@ class PrivateRecipeApiTests(TestCase):
         # Perform HTTP PATCH on the recipe detail URL
         res = self.client.patch(
             url,
-            json.dumps(payload, cls=DjangoJSONEncoder),
-            content_type='application/json'
+            payload,
+            format='json'
         )
 
         # Check the response is 200 (OK)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
-        # Refresh the recipe to get updated data
-        recipe.refresh_from_db()
+        # Retrieve the names of the recipe's tags
+        tag_names = list(recipe.tags.values_list('name', flat=True))
 
         # Check the old tag is no longer associated with the recipe
-        self.assertNotIn(old_tag, recipe.tags.all())
+        self.assertNotIn(old_tag.name, tag_names)
 
         # Check the new tag is associated with the recipe
-        tag_names = [tag.name for tag in recipe.tags.all()]
         self.assertIn('New Test Tag', tag_names)
 
     def test_update_recipe_delete_tags(self):
         """Test deleting assigned tags from a recipe"""
 
-        # Create a recipe
-        recipe = create_test_recipe(user=self.user)
-
         # Create a tag
         tag = create_test_tag(user=self.user, name='Test Tag')
 
-        # Assign the tag to the recipe
-        recipe.tags.add(tag)
+        # Create a recipe with the tag assigned
+        recipe = create_test_recipe(user=self.user, tags=[tag])
 
         # Generate the URL for the recipe detail
         url = recipe_detail_url(recipe.id)
@@ -670,7 +1094,7 @@ class PrivateRecipeApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
         # Check tags were cleared from the recipe
-        self.assertEqual(recipe.tags.count(), 0)
+        self.assertFalse(recipe.tags.exists())
 
     def test_delete_recipe(self):
         """Test deleting a recipe"""
@@ -693,14 +1117,8 @@ class PrivateRecipeApiTests(TestCase):
     def test_delete_other_users_recipe_error(self):
         """Test deleting another user's recipe returns an error"""
 
-        # Create a second user
-        new_user = create_user(
-            email='secondUser@test.com',
-            password='secondUserPassword'
-        )
-
         # Create a recipe for the second user
-        recipe = create_test_recipe(user=new_user)
+        recipe = create_test_recipe(user=self.other_user)
 
         # Generate the URL for the recipe detail
         url = recipe_detail_url(recipe.id)
@@ -2,9 +2,8 @@
 Unit Test Suite for the Tags API
 """
 from core.models import Recipe, Tag
-from recipe.serializers import TagSerializer
 
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 from django.urls import reverse
 from django.contrib.auth import get_user_model as user_model
 
@@ -16,23 +15,37 @@ from decimal import Decimal
 
 TAGS_URL = reverse('recipe:tag-list')
 
+TAG_DETAIL_URL = reverse(
+    'recipe:tag-detail',
+    args=[0]
+).replace('/0/', '/{}/')
+
 
 def create_user(email='TestEmail@test.com', password='TestPassword'):
     """Create a test user and return it"""
     return user_model().objects.create_user(email, password)
 
 
+def assign_tags_bulk(recipe_tag_pairs):
+    """Assign each (recipe, tag) pair with a single INSERT"""
+    through = Recipe.tags.through
+    through.objects.bulk_create(
+        [
+            through(recipe_id=recipe.id, tag_id=tag.id)
+            for recipe, tag in recipe_tag_pairs
+        ],
+        ignore_conflicts=True
+    )
+
+
 def tag_detail_url(tag_id):
     """Return the URL for a tag detail"""
-    return reverse('recipe:tag-detail', args=[tag_id])
+    return TAG_DETAIL_URL.format(tag_id)
 
 
-class PublicTagsApiTests(TestCase):
+class PublicTagsApiTests(SimpleTestCase):
     """Test the publicly available Tags API"""
-
-    def setUp(self):
-        """Setup the test client"""
-        self.client = APIClient()
+    client_class = APIClient
 
     def test_login_required(self):
         """Test that login is required for retrieving tags"""
@@ -46,34 +59,39 @@ class PublicTagsApiTests(TestCase):
 
 class PrivateTagsApiTests(TestCase):
     """Test private Tags API"""
+    client_class = APIClient
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create the authenticated user once for all tests"""
+        cls.user = create_user()
 
     def setUp(self):
-        """Setup the test client"""
-        self.user = create_user()
-        self.client = APIClient()
+        """Log the user in to the test client"""
         self.client.force_authenticate(self.user)
 
     def test_retrieve_tags(self):
         """Test retrieving tags"""
 
         # Create sample tags
-        Tag.objects.create(user=self.user, name='Quick and Easy')
-        Tag.objects.create(user=self.user, name='Breakfast')
+        Tag.objects.bulk_create([
+            Tag(user=self.user, name='Quick and Easy'),
+            Tag(user=self.user, name='Breakfast'),
+        ])
 
-        # Attempt to get tags
-        res = self.client.get(TAGS_URL)
-
-        # Retrieve all tags from the database in descending order
-        tags = Tag.objects.all().order_by('-name')
-
-        # Serialize the tags
-        serializer = TagSerializer(tags, many=True)
+        # Attempt to get tags with a single query
+        with self.assertNumQueries(1):
+            res = self.client.get(TAGS_URL)
 
         # Check that the response status code is 200 (OK)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
-        # Check that the response data matches the serialized tags
-        self.assertEqual(res.data, serializer.data)
+        # Retrieve the serialized fields of the tags from the database in
+        # one query (descending order)
+        tags = list(Tag.objects.order_by('-name').values('id', 'name'))
+
+        # Check that the response data matches the tags
+        self.assertEqual(res.data, tags)
 
     def test_tags_limited_to_user(self):
         """Test that tags returned are for the authenticated user"""
@@ -84,11 +102,12 @@ class PrivateTagsApiTests(TestCase):
             password='TestPassword2'
         )
 
-        # Create sample tags
-        Tag.objects.create(user=newUser, name='Low Carb')
-
-        # Create sample tags for the authenticated user
-        tag = Tag.objects.create(user=self.user, name='Vegetarian')
+        # Create a sample tag for each user, keeping the authenticated
+        # user's tag
+        _, tag = Tag.objects.bulk_create([
+            Tag(user=newUser, name='Low Carb'),
+            Tag(user=self.user, name='Vegetarian'),
+        ])
 
         # Attempt to get tags
         res = self.client.get(TAGS_URL)
@@ -120,10 +139,11 @@ class PrivateTagsApiTests(TestCase):
         tag_1 = Tag.objects.create(user=self.user, name='Low Carb')
 
         # Assign tag to the test recipe
-        new_recipe.tags.add(tag_1)
+        assign_tags_bulk([(new_recipe, tag_1)])
 
-        # Attempt to get tag
-        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+        # Attempt to get tag with a single query
+        with self.assertNumQueries(1):
+            res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
         # Check that the response status code is 200 (OK)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -134,33 +154,85 @@ class PrivateTagsApiTests(TestCase):
         # Check that the returned tag is the correct one
         self.assertEqual(res.data[0]['name'], tag_1.name)
 
-    def test_filter_tags_no_duplicates(self):
-        """Test that filtered tags do not contain duplicates"""
+    def test_filter_tags_to_only_assigned_with_true(self):
+        """Test assigned_only also accepts 'true' and non-zero integers"""
 
-        # Create two test recipes
-        test_recipe_1 = Recipe.objects.create(
+        # Create a test recipe and two tags, assigning only the first
+        new_recipe = Recipe.objects.create(
             user=self.user,
-            title='Korean Chicken',
+            title='Sushi',
             time_minutes=10,
-            price=Decimal('9.00')
+            price=Decimal('5.00')
         )
-        test_recipe_2 = Recipe.objects.create(
-            user=self.user,
-            title='Pizza',
-            time_minutes=15,
-            price=Decimal('12.00')
+        tag_1, _ = Tag.objects.bulk_create([
+            Tag(user=self.user, name='Low Carb'),
+            Tag(user=self.user, name='Vegetarian'),
+        ])
+        assign_tags_bulk([(new_recipe, tag_1)])
+
+        # Attempt to get the assigned tags with each value, checking that
+        # only the assigned tag is returned
+        for assigned_only in ('true', '2'):
+            res = self.client.get(TAGS_URL, {'assigned_only': assigned_only})
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual([tag['id'] for tag in res.data], [tag_1.id])
+
+    def test_filter_tags_invalid_assigned_only_error(self):
+        """Test an assigned_only value that isn't a boolean is rejected"""
+
+        # Attempt to get the tags with an unknown value
+        res = self.client.get(TAGS_URL, {'assigned_only': 'abc'})
+
+        # Check the response is 400 (Bad Request)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_tags_empty_assigned_only(self):
+        """Test an empty assigned_only value leaves the filter off"""
+
+        # Create an unassigned tag
+        unassigned_tag = Tag.objects.create(user=self.user, name='Vegan')
+
+        # Get the tags with an empty value
+        res = self.client.get(TAGS_URL, {'assigned_only': ''})
+
+        # Check that the unassigned tag is returned
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [tag['id'] for tag in res.data],
+            [unassigned_tag.id]
         )
 
-        # Create two tags, saving one to a variable
-        tag = Tag.objects.create(user=self.user, name='Quick and Easy')
-        Tag.objects.create(user=self.user, name='Vegetarian')
+    def test_filter_tags_no_duplicates(self):
+        """Test that filtered tags do not contain duplicates"""
+
+        # Create two test recipes
+        test_recipe_1, test_recipe_2 = Recipe.objects.bulk_create([
+            Recipe(
+                user=self.user,
+                title='Korean Chicken',
+                time_minutes=10,
+                price=Decimal('9.00')
+            ),
+            Recipe(
+                user=self.user,
+                title='Pizza',
+                time_minutes=15,
+                price=Decimal('12.00')
+            ),
+        ])
+
+        # Create two tags, keeping the first
+        tag, _ = Tag.objects.bulk_create([
+            Tag(user=self.user, name='Quick and Easy'),
+            Tag(user=self.user, name='Vegetarian'),
+        ])
 
         # Assign first tag to the test recipes
-        test_recipe_1.tags.add(tag)
-        test_recipe_2.tags.add(tag)
+        assign_tags_bulk([(test_recipe_1, tag), (test_recipe_2, tag)])
 
-        # Attempt to get tags
-        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+        # Attempt to get tags with a single query
+        with self.assertNumQueries(1):
+            res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
         # Check that the response status code is 200 (OK)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -180,14 +252,32 @@ class PrivateTagsApiTests(TestCase):
         # Attempt to update the tag
         res = self.client.patch(tag_detail_url(tag.id), payload)
 
-        # Refresh the tag from the database
-        tag.refresh_from_db()
-
         # Check that the response status code is 200 (OK)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
-        # Check that the tag name was updated
-        self.assertEqual(tag.name, payload['name'])
+        # Check that the tag name was updated, reading only the name
+        self.assertEqual(
+            Tag.objects.values_list('name', flat=True).get(id=tag.id),
+            payload['name']
+        )
+
+    def test_create_duplicate_tag_error(self):
+        """Test creating a tag with a name the user already has fails"""
+
+        # Create a tag
+        Tag.objects.create(user=self.user, name='Test Tag')
+
+        # Attempt to create a second tag with the same name
+        res = self.client.post(TAGS_URL, {'name': 'Test Tag'})
+
+        # Check that the response status code is 400 (Bad Request)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Check that only one tag exists with the name
+        self.assertEqual(
+            Tag.objects.filter(user=self.user, name='Test Tag').count(),
+            1
+        )
 
     def test_delete_tag_successful(self):
         """Test deleting a tag is successful"""
@@ -4,10 +4,24 @@ Views for the Recipe API
 
 from core.models import Recipe, Ingredient, Tag
 from recipe import serializers
+from recipe.cache import (
+    list_cache_key,
+    list_cache_timeout,
+    list_etag,
+)
+
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+from django.utils.decorators import method_decorator
+from django.utils.translation import gettext as _
+from django.views.decorators.http import etag
 
 from rest_framework import viewsets, mixins
 from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
 from drf_spectacular.utils import (
     OpenApiParameter,
@@ -17,51 +31,167 @@ from drf_spectacular.utils import (
 )
 
 
+# Query parameter words that switch a boolean filter on or off (any other
+# integer counts as on unless it's 0, as bool(int(value)) did, and an empty
+# value leaves the filter off)
+TRUE_VALUES = frozenset({'true', 'yes'})
+FALSE_VALUES = frozenset({'false', 'no'})
+
+# Largest id the database can compare against (a signed 64-bit integer)
+MAX_ID = 2 ** 63 - 1
+
+# Query parameters documented on the list endpoints' schemas
+INGREDIENTS_PARAMETER = OpenApiParameter(
+    name='ingredients',
+    type=OpenApiTypes.STR,
+    description='Comma-seperated list of ingredient IDs',
+)
+TAGS_PARAMETER = OpenApiParameter(
+    name='tags',
+    type=OpenApiTypes.STR,
+    description='Comma-seperated list of tag IDs',
+)
+ASSIGNED_ONLY_VALUES = (
+    'true, yes or a non-zero integer to filter; false, no, 0 or empty '
+    '(the default) not to'
+)
+ASSIGNED_INGREDIENTS_PARAMETER = OpenApiParameter(
+    name='assigned_only',
+    type=OpenApiTypes.STR,
+    description='Filter to only return assigned ingredients: '
+                + ASSIGNED_ONLY_VALUES,
+)
+ASSIGNED_TAGS_PARAMETER = OpenApiParameter(
+    name='assigned_only',
+    type=OpenApiTypes.STR,
+    description='Filter to only return assigned tags: '
+                + ASSIGNED_ONLY_VALUES,
+)
+
+
+def _assigned_only(query_params):
+    """Return whether the request asks for assigned objects only"""
+    value = query_params.get('assigned_only', '').lower()
+    if value in TRUE_VALUES:
+        return True
+    if not value or value in FALSE_VALUES:
+        return False
+
+    try:
+        return bool(int(value))
+    except ValueError:
+        raise ValidationError(
+            _('Expected assigned_only to be an integer or true / false.'),
+            code='invalid'
+        )
+
+
+class OptionalLimitOffsetPagination(LimitOffsetPagination):
+    """Paginate only the list requests that pass a limit
+
+    Without a limit the whole list is returned as before, so existing
+    clients don't pay for the paginator's extra COUNT(*) query.
+    """
+    max_limit = 100
+
+
+class EagerLoadingMixin:
+    """Load the relations the view's serializer renders with the queryset
+
+    Serializers declare what to load in a setup_eager_loading classmethod,
+    so each viewset doesn't have to repeat it in get_queryset.
+    """
+
+    def get_queryset(self):
+        """Return the queryset prepared for the serializer class"""
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset)
+        return queryset
+
+
+class CachedListMixin:
+    """Cache each user's list responses until their data next changes
+
+    List responses always carry an ETag of the user's list version, which
+    is kept in CACHES['default'] even when response caching is off, so a
+    request whose If-None-Match still matches gets a 304 without running
+    the list query. Caching the response data as well is enabled by the
+    RECIPE_LIST_CACHE_TIMEOUT setting.
+
+    Every write of the user's recipes, ingredients or tags expires their
+    cached lists and ETags once it commits, through the model signals
+    handled in recipe.cache and, for its signal-less writes, through
+    RecipeSerializer.
+    """
+
+    @method_decorator(etag(list_etag))
+    def list(self, request, *args, **kwargs):
+        """Return the cached list data, caching it on a miss"""
+        timeout = list_cache_timeout()
+        if not timeout:
+            return super().list(request, *args, **kwargs)
+
+        key = list_cache_key(request, self.basename)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+        cache.set(key, response.data, timeout)
+        return response
+
+
 @extend_schema_view(
     list=extend_schema(
         description="Get a list of recipes",
-        parameters=[
-            OpenApiParameter(
-                name='ingredients',
-                type=OpenApiTypes.STR,
-                description='Comma-seperated list of ingredient IDs',
-            ),
-            OpenApiParameter(
-                name='tags',
-                type=OpenApiTypes.STR,
-                description='Comma-seperated list of tag IDs',
-            ),
-        ],
+        parameters=[INGREDIENTS_PARAMETER, TAGS_PARAMETER],
     ),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(CachedListMixin,
+                    EagerLoadingMixin,
+                    viewsets.ModelViewSet):
     """Viewset for managing the Recipe model"""
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    # Return lists whole unless the client asks for a page with ?limit=
+    pagination_class = OptionalLimitOffsetPagination
 
     def get_queryset(self):
         """Return recipes for the authenticated user only"""
         # Get query parameters called 'ingredients' and 'tags'
-        ingredients = self.request.query_params.get('ingredients')
-        tags = self.request.query_params.get('tags')
+        ingredients = self.request.query_params.get('ingredients', '')
+        tags = self.request.query_params.get('tags', '')
 
-        # Get a reference to the queryset
-        qs = self.queryset
+        # Get the authenticated user's recipes, with ingredients and tags
+        # prefetched
+        qs = super().get_queryset().filter(user=self.request.user)
 
-        # Filter the queryset based on the query parameters
-        if ingredients:
-            ingredientIds = self._list_str_to_list_int(ingredients)
-            qs = qs.filter(ingredients__id__in=ingredientIds)
-        if tags:
-            tagIds = self._list_str_to_list_int(tags)
-            qs = qs.filter(tags__id__in=tagIds)
+        # Filter the queryset based on the query parameters, using EXISTS
+        # subqueries on the link tables so that a recipe matching several
+        # ids isn't repeated (and no DISTINCT is needed)
+        ingredientIds = self._list_str_to_list_int(ingredients)
+        if ingredientIds:
+            qs = qs.filter(Exists(
+                Recipe.ingredients.through.objects.filter(
+                    recipe_id=OuterRef('pk'),
+                    ingredient_id__in=ingredientIds
+                )
+            ))
+        tagIds = self._list_str_to_list_int(tags)
+        if tagIds:
+            qs = qs.filter(Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe_id=OuterRef('pk'),
+                    tag_id__in=tagIds
+                )
+            ))
 
-        # Return the filtered queryset
-        return qs.filter(
-            user=self.request.user
-        ).order_by('-id').distinct()
+        # Return the filtered queryset, newest first
+        return qs.order_by('-id')
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
@@ -75,85 +205,79 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
     def _list_str_to_list_int(self, query_params):
-        """Cast a list of strings to a list of integers"""
-        return [int(id) for id in query_params.split(',')]
+        """Cast a comma-separated string of ids to a list of integers"""
+        try:
+            ids = list(map(int, filter(None, query_params.split(','))))
+        except ValueError:
+            ids = None
 
+        # Reject anything but positive ids the database can compare against,
+        # as larger numbers overflow its integers
+        if ids is None or not all(0 < id_ <= MAX_ID for id_ in ids):
+            raise ValidationError(
+                _('Expected a comma-separated list of ids.'),
+                code='invalid'
+            )
+        return ids
 
-@extend_schema_view(
-    list=extend_schema(
-        description="Get a list of ingredients",
-        parameters=[
-            OpenApiParameter(
-                name='assigned_only',
-                type=OpenApiTypes.INT, enum=[0, 1],
-                description='Filter to only return assigned ingredients',
-            ),
-        ],
-    ),
-)
-class IngredientViewSet(viewsets.GenericViewSet,
-                        mixins.CreateModelMixin,
-                        mixins.ListModelMixin,
-                        mixins.UpdateModelMixin,
-                        mixins.DestroyModelMixin):
-    """Viewset for managing the Ingredient model"""
-    serializer_class = serializers.IngredientSerializer
+
+class UserOwnedNameViewSet(CachedListMixin,
+                           viewsets.GenericViewSet,
+                           mixins.CreateModelMixin,
+                           mixins.ListModelMixin,
+                           mixins.UpdateModelMixin,
+                           mixins.DestroyModelMixin):
+    """Base viewset for the named objects users attach to recipes
+
+    Subclasses set queryset, serializer_class and recipe_field, the name of
+    the Recipe many-to-many field linking recipes to their objects.
+    """
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
-    queryset = Ingredient.objects.all()
+    pagination_class = None
+    recipe_field = None
 
     def get_queryset(self):
-        """Return ingredients for the authenticated user only"""
-        assigned_only = bool(
-            int(self.request.query_params.get('assigned_only', 0))
-        )
-        qs = self.queryset
+        """Return objects for the authenticated user only"""
+        assigned_only = _assigned_only(self.request.query_params)
+        qs = self.queryset.filter(user=self.request.user)
         if assigned_only:
-            qs = qs.filter(recipe__isnull=False)
-        return qs.filter(
-            user=self.request.user
-        ).order_by('-name').distinct()
+            # Keep objects linked to any recipe with a correlated EXISTS
+            # rather than a JOIN, which repeats them and needs DISTINCT
+            field = Recipe._meta.get_field(self.recipe_field)
+            qs = qs.filter(Exists(
+                field.remote_field.through.objects.filter(
+                    **{field.m2m_reverse_field_name(): OuterRef('pk')}
+                )
+            ))
+        return qs.order_by('-name')
 
     def perform_create(self, serializer):
-        """Create a new ingredient"""
+        """Create a new object for the authenticated user"""
         serializer.save(user=self.request.user)
 
 
+@extend_schema_view(
+    list=extend_schema(
+        description="Get a list of ingredients",
+        parameters=[ASSIGNED_INGREDIENTS_PARAMETER],
+    ),
+)
+class IngredientViewSet(UserOwnedNameViewSet):
+    """Viewset for managing the Ingredient model"""
+    serializer_class = serializers.IngredientSerializer
+    queryset = Ingredient.objects.all()
+    recipe_field = 'ingredients'
+
+
 @extend_schema_view(
     list=extend_schema(
         description="Get a list of tags",
-        parameters=[
-            OpenApiParameter(
-                name='assigned_only',
-                type=OpenApiTypes.INT, enum=[0, 1],
-                description='Filter to only return assigned tags',
-            ),
-        ],
+        parameters=[ASSIGNED_TAGS_PARAMETER],
     ),
 )
-class TagViewSet(viewsets.GenericViewSet,
-                 mixins.CreateModelMixin,
-                 mixins.ListModelMixin,
-                 mixins.UpdateModelMixin,
-                 mixins.DestroyModelMixin):
+class TagViewSet(UserOwnedNameViewSet):
     """Viewset for managing the Tag model"""
     serializer_class = serializers.TagSerializer
-    authentication_classes = (TokenAuthentication,)
-    permission_classes = (IsAuthenticated,)
     queryset = Tag.objects.all()
-
-    def get_queryset(self):
-        """Return tags for the authenticated user only"""
-        assigned_only = bool(
-            int(self.request.query_params.get('assigned_only', 0))
-        )
-        qs = self.queryset
-        if assigned_only:
-            qs = qs.filter(recipe__isnull=False)
-        return qs.filter(
-            user=self.request.user
-        ).order_by('-name').distinct()
-
-    def perform_create(self, serializer):
-        """Create a new tag"""
-        serializer.save(user=self.request.user)
+    recipe_field = 'tags'
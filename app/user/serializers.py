@@ -9,21 +9,45 @@ from django.contrib.auth import (
 from django.utils.translation import gettext as _
 
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
 
+# Look the user model up once, not on every serializer use
+User = user_model()
 
-class UserSerializer(serializers.ModelSerializer):
+# Reject duplicate emails with the model's own message, as ModelSerializer
+# did ("user with this email already exists.")
+_email_field = User._meta.get_field('email')
+EMAIL_UNIQUE_MESSAGE = _email_field.error_messages['unique'] % {
+    'model_name': User._meta.verbose_name,
+    'field_label': _email_field.verbose_name,
+}
+
+
+class UserSerializer(serializers.Serializer):
     """Serializer for the User object"""
 
-    # Meta class is used to configure the serializer
-    class Meta:
-        model = user_model()
-        fields = ['email', 'password', 'name']
-        extra_kwargs = {'password': {'write_only': True, 'min_length': 8}}
+    # Fields are declared explicitly, mirroring the User model, so they
+    # aren't rebuilt from the model meta for every serializer instance
+    email = serializers.EmailField(
+        max_length=255,
+        validators=[
+            UniqueValidator(
+                queryset=User.objects.all(),
+                message=EMAIL_UNIQUE_MESSAGE,
+            ),
+        ],
+    )
+    password = serializers.CharField(
+        max_length=128,
+        min_length=8,
+        write_only=True,
+    )
+    name = serializers.CharField(max_length=25)
 
     # Override the create function to create a user with a hashed password
     def create(self, validated_data):
         """Create a new user with a hashed password and return it"""
-        return user_model().objects.create_user(**validated_data)
+        return User.objects.create_user(**validated_data)
 
     def update(self, instance, validated_data):
         """Update a user, setting the password correctly and return it"""
@@ -31,14 +55,17 @@ class UserSerializer(serializers.ModelSerializer):
         password = validated_data.pop('password', None)
 
         # Update the user with the validated data
-        user = super().update(instance, validated_data)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
 
         # If a password was provided, set it
         if password:
-            user.set_password(password)
-            user.save()
+            instance.set_password(password)
+
+        # Save the changes with a single query
+        instance.save()
 
-        return user
+        return instance
 
 
 class AuthTokenSerializer(serializers.Serializer):
@@ -54,8 +81,10 @@ class AuthTokenSerializer(serializers.Serializer):
     def validate(self, attributes):
         """Validate and authenticate the user"""
 
-        # Retrieve and store the email and password from the attributes
-        email = attributes.get('email')
+        # Retrieve and store the email and password from the attributes,
+        # normalizing the email's domain as create_user() does when storing
+        # it, so a differently cased domain still finds the user
+        email = User.objects.normalize_email(attributes.get('email'))
         password = attributes.get('password')
 
         # Authenticate the user
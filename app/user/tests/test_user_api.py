@@ -22,9 +22,7 @@ def create_user(**params):
 
 class PublicUserApiTests(TestCase):
     """Test public features of the User API"""
-
-    def setUp(self):
-        self.client = APIClient()  # Create a client
+    client_class = APIClient
 
     def test_create_valid_user_success(self):
         """Test creating user with valid payload is successful"""
@@ -62,6 +60,12 @@ class PublicUserApiTests(TestCase):
         # Check that the response is 400 (Bad Request)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+        # Check that the error names the existing user's email
+        self.assertEqual(
+            res.data['email'],
+            ['user with this email already exists.']
+        )
+
     def test_user_with_short_password_error(self):
         """
         Test creating a user with a password <8 characters returns an error
@@ -109,6 +113,28 @@ class PublicUserApiTests(TestCase):
         # Check that the token is in the response
         self.assertIn('token', res.data)
 
+    def test_user_token_creation_email_domain_case(self):
+        """
+        Test token creation when the email domain's case doesn't match
+        """
+        create_user(
+            email='TestEmail@test.com',
+            password='TestPassword123'
+        )
+
+        # Create and send payload with the email domain in upper case
+        payload = {
+            'email': 'TestEmail@TEST.COM',
+            'password': 'TestPassword123'
+        }
+        res = self.client.post(TOKEN_URL, payload)
+
+        # Check that the response is 200 (OK)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        # Check that the token is in the response
+        self.assertIn('token', res.data)
+
     def test_user_token_invalid_credentials(self):
         """
         Test that a token isn't created if invalid credentials
@@ -162,14 +188,19 @@ class PrivateUserApiTests(TestCase):
     """
     Test private features of the User API
     """
+    client_class = APIClient
 
-    def setUp(self):
-        self.user = create_user(
+    @classmethod
+    def setUpTestData(cls):
+        """Create the authenticated user once for all tests"""
+        cls.user = create_user(
             email='TestEmail@test.com',
             password='TestPassword123',
             name='Test Name'
         )
-        self.client = APIClient()
+
+    def setUp(self):
+        """Log the user in to the test client"""
         self.client.force_authenticate(user=self.user)
 
     def test_retrieve_user_success(self):